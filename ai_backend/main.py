@@ -1,21 +1,71 @@
-from fastapi import FastAPI, HTTPException, UploadFile, Form, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, Form, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
+import httpx
 import openai
-from PIL import Image
-import io
-from tools.statement_reader import read_statement
-from tools.youtube_processor import process_youtube_video
-import json
+from google import genai
 
-# Load environment variables
+# Load environment variables before the tools read their settings at import
 load_dotenv()
 
+from tools.statement_reader import read_statement
+from tools.youtube_processor import (
+    SUMMARY_FAILED_MESSAGE,
+    extract_video_id,
+    fetch_video_transcript,
+    generate_summary_stream,
+    process_youtube_video,
+)
+import orjson
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared API clients on startup and close them on shutdown."""
+    # Initialize OpenAI client with proper configuration
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    # One pooled Gemini client and HTTP client for the whole process. Without
+    # GEMINI_API_KEY the app still starts; only the Gemini-backed routes fail.
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    app.state.genai = genai.Client(api_key=gemini_api_key) if gemini_api_key else None
+    app.state.http_client = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    )
+    # Dedicated pool for the blocking transcript client, kept separate from the
+    # event loop's default executor
+    app.state.transcript_executor = ThreadPoolExecutor(
+        max_workers=max(1, int(os.getenv("YOUTUBE_MAX_WORKERS", "16"))),
+        thread_name_prefix="youtube-io",
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+        if app.state.genai is not None:
+            await app.state.genai.aio.aclose()
+            app.state.genai.close()
+        app.state.transcript_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_genai_client(http_request: Request) -> genai.Client:
+    """Return the shared Gemini client, or fail with 503 if it isn't configured."""
+    client = http_request.app.state.genai
+    if client is None:
+        raise HTTPException(
+            status_code=503, detail="Gemini is not configured on this server."
+        )
+    return client
+
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -26,8 +76,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client with proper configuration
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Gemini rejects inline requests above 20MB in total, and the SDK base64
+# encodes the image (about 4/3 larger), so raw uploads above ~15MB would fail
+# upstream. They are refused before being read into memory.
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))
 
 
 class ChatMessage(BaseModel):
@@ -43,21 +95,29 @@ class YouTubeRequest(BaseModel):
     url: str
 
 
-async def process_image(file: UploadFile, message: str) -> str:
+async def process_image(client: genai.Client, file: UploadFile, message: str) -> str:
     """Process an uploaded image using OCR."""
+    # Starlette spools the upload to disk, so check its size before buffering it
+    if file.size is not None and file.size > MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image too large. Maximum size is {MAX_IMAGE_BYTES} bytes.",
+        )
     try:
         # Read the image file
         contents = await file.read()
         # extract statement transcations
-        transactions = read_statement(contents, message)
-        return json.loads(transactions)["transactions"]
+        transactions = await read_statement(client, contents, message)
+        return orjson.loads(transactions)["transactions"]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
 @app.post("/api/chat")
 async def chat(
-    file: Optional[UploadFile] = File(None), message: Optional[str] = Form(None)
+    http_request: Request,
+    file: Optional[UploadFile] = File(None),
+    message: Optional[str] = Form(None),
 ):
     try:
         messages = []
@@ -66,7 +126,9 @@ async def chat(
         # If there's a file, process it with OCR to extract necessary transaction information.
         if file:
             if file.content_type.startswith("image/"):
-                ocr_text = await process_image(file, message)
+                ocr_text = await process_image(
+                    get_genai_client(http_request), file, message
+                )
                 system_message = {
                     "role": "system",
                     "content": "You are a financial assistant. Analyze the following bank statement and extract all transactions:",
@@ -109,35 +171,40 @@ async def chat(
             "task_type": "add_transactions",
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/youtube-summary")
-async def youtube_summary(request: YouTubeRequest):
+async def youtube_summary(request: YouTubeRequest, http_request: Request):
     """
     Process a YouTube video URL to extract transcript and generate summary.
 
     Args:
         request (YouTubeRequest): Request containing YouTube URL
+        http_request (Request): Incoming request, used to reach the shared clients
 
     Returns:
         Dict[str, Any]: Processing results including summary and metadata
     """
     try:
-        # Validate the URL (basic check)
-        if (
-            not request.url
-            or "youtube.com" not in request.url
-            and "youtu.be" not in request.url
-        ):
+        # Validate the URL by extracting the video ID
+        video_id = extract_video_id(request.url)
+        if not video_id:
             raise HTTPException(
                 status_code=400,
                 detail="Invalid YouTube URL. Please provide a valid YouTube video URL.",
             )
 
         # Process the YouTube video
-        result = process_youtube_video(request.url)
+        result = await process_youtube_video(
+            get_genai_client(http_request),
+            http_request.app.state.http_client,
+            http_request.app.state.transcript_executor,
+            video_id,
+        )
 
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["error"])
@@ -164,6 +231,70 @@ async def youtube_summary(request: YouTubeRequest):
         )
 
 
+def format_sse(data: str, event: Optional[str] = None) -> str:
+    """Format a server-sent event, prefixing every line of the payload."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+@app.post("/api/youtube-summary/stream")
+async def youtube_summary_stream(request: YouTubeRequest, http_request: Request):
+    """
+    Process a YouTube video URL and stream the summary as server-sent events.
+
+    Emits a `metadata` event with the video details, one `data` event per
+    summary chunk as it is generated, and a final `done` event. If generation
+    fails, an `error` event is sent instead of `done` and any chunks already
+    sent should be discarded.
+
+    Args:
+        request (YouTubeRequest): Request containing YouTube URL
+        http_request (Request): Incoming request, used to reach the shared clients
+
+    Returns:
+        StreamingResponse: text/event-stream of the summary
+    """
+    # Validate the URL by extracting the video ID
+    video_id = extract_video_id(request.url)
+    if not video_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid YouTube URL. Please provide a valid YouTube video URL.",
+        )
+
+    client = get_genai_client(http_request)
+    try:
+        video = await fetch_video_transcript(
+            http_request.app.state.http_client,
+            http_request.app.state.transcript_executor,
+            video_id,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error processing YouTube video: {str(e)}"
+        )
+
+    if not video["success"]:
+        raise HTTPException(status_code=400, detail=video["error"])
+
+    metadata = video["metadata"]
+
+    async def events():
+        yield format_sse(orjson.dumps(metadata).decode(), event="metadata")
+        try:
+            async for text in generate_summary_stream(
+                client, video["transcript_text"], metadata
+            ):
+                yield format_sse(text)
+        except Exception:
+            yield format_sse(SUMMARY_FAILED_MESSAGE, event="error")
+            return
+        yield format_sse("", event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,39 @@
+import pytest
+
+from tools.youtube_processor import split_transcript
+
+
+def test_short_transcript_is_a_single_chunk():
+    assert split_transcript("just a few words", chunk_chars=100) == ["just a few words"]
+
+
+def test_splits_at_sentence_boundary():
+    text = "First sentence here. Second one follows on."
+    assert split_transcript(text, chunk_chars=30) == [
+        "First sentence here.",
+        "Second one follows on.",
+    ]
+
+
+def test_falls_back_to_word_boundary_without_sentences():
+    text = "alpha beta gamma delta epsilon"
+    chunks = split_transcript(text, chunk_chars=12)
+    assert chunks == ["alpha beta", "gamma delta", "epsilon"]
+    assert all(len(chunk) <= 12 for chunk in chunks)
+
+
+def test_hard_cuts_text_without_spaces():
+    assert split_transcript("x" * 25, chunk_chars=10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_chunks_preserve_all_words_in_order():
+    text = " ".join(f"word{i}." if i % 7 == 0 else f"word{i}" for i in range(500))
+    chunks = split_transcript(text, chunk_chars=200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+@pytest.mark.parametrize("chunk_chars", [0, -5])
+def test_rejects_non_positive_chunk_size(chunk_chars):
+    with pytest.raises(ValueError):
+        split_transcript("some text", chunk_chars=chunk_chars)
@@ -0,0 +1,9 @@
+import asyncio
+import os
+
+# Upper bound on in-flight Gemini requests shared by every endpoint.
+# Tune to the provider's rate limit to avoid 429s under load. Clamped so a
+# zero or negative value can't leave the semaphore permanently locked.
+GEMINI_MAX_CONCURRENCY = max(1, int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")))
+
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
@@ -1,6 +1,10 @@
+import asyncio
+import logging
 import re
+from concurrent.futures import Executor
 import os
-from typing import Dict, Any, List, Optional, Tuple
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from cachetools import TTLCache
 from youtube_transcript_api import (
     YouTubeTranscriptApi,
     TranscriptsDisabled,
@@ -8,9 +12,88 @@ from youtube_transcript_api import (
 )
 from google import genai
 from google.genai import types
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-import os
+import httpx
+from .llm import gemini_semaphore
+
+logger = logging.getLogger(__name__)
+
+
+YOUTUBE_VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+
+# Successful results keyed by video ID, so repeat URLs skip the YouTube and
+# Gemini round trips
+_RESULT_CACHE: TTLCache = TTLCache(
+    maxsize=int(os.environ.get("YOUTUBE_CACHE_SIZE", "1024")),
+    ttl=int(os.environ.get("YOUTUBE_CACHE_TTL", "3600")),
+)
+
+SUMMARY_MODEL = "gemini-2.0-flash-thinking-exp-01-21"
+
+SUMMARY_FAILED_MESSAGE = "Failed to generate summary. Please try again later."
+
+# Matches watch, embed, v, shorts and youtu.be URL formats
+VIDEO_ID_RE = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|embed/|v/|shorts/)|youtu\.be/)([^&\n?#]+)"
+)
+
+
+# Static system prompt for the transcript summarizer
+_SYS_PART = types.Part.from_text(
+    text="""You are an expert YouTube transcript summarizer. Analyze the provided YouTube video transcript to identify its core concepts, major arguments, and essential information. Generate a concise yet comprehensive summary report structured according to the guidelines below. The goal is to allow someone to quickly understand the video's main message, key findings, and overall significance without watching the entire video.
+
+Output Structure & Guidelines:
+
+1.  Key Points / Core Concepts:
+    * Identify and list the 3-5 most critical concepts, arguments, or findings discussed in the video.
+    * Use concise, informative bullet points. Each point should represent a distinct major idea.
+    * Focus on *what* is being discussed, not just topic mentions.
+
+
+2.  Detailed Summary:
+    * Weave the Key Points identified above into a coherent narrative summary.
+    * Expand on each key point by incorporating supporting details, context, explanations, important facts, figures, statistics, or specific examples mentioned in the transcript.
+    * Ensure the summary flows logically, connecting the different ideas presented in the video.
+    * Maintain a neutral and objective tone, accurately reflecting the information in the transcript.
+    * Prioritize clarity and conciseness while ensuring all crucial information is included.
+
+
+3.  Main Takeaway / Conclusion:
+    * State the single most important message, conclusion, or call to action the video aims to convey.
+    * This should encapsulate the essence or primary purpose of the video in one or two sentences.
+
+Mandatory Formatting & Rules:
+* Format the entire output using Markdown for readability (use bullet points, bolding where appropriate).
+* Strictly adhere to the section structure: Key Points, Detailed Summary, Main Takeaway.
+* **Do not** include any introductory phrases like \"Here's a summary...\" or \"This report summarizes...\".
+* Base the summary *only* on the provided transcript text. Do not add external information or interpretations not explicitly supported by the transcript."""
+)
+
+# Request-independent generation config, built once at import
+_SUMMARY_CONFIG = types.GenerateContentConfig(
+    temperature=0.2,
+    response_mime_type="text/plain",
+    system_instruction=[_SYS_PART],
+)
+
+# Transcripts longer than this many characters are summarized section by
+# section in parallel before the final summary call. Clamped so a zero or
+# tiny value can't explode into thousands of calls.
+SUMMARY_CHUNK_CHARS = max(1000, int(os.environ.get("SUMMARY_CHUNK_CHARS", "16000")))
+
+# System prompt and config for summarizing one section of a long transcript
+_SECTION_SYS_PART = types.Part.from_text(
+    text="""You are summarizing one section of a longer YouTube video transcript. Extract the key concepts, arguments, facts, figures, statistics and examples discussed in this section as concise Markdown bullet points.
+
+Rules:
+* Base the notes *only* on the provided section. Do not add external information.
+* **Do not** include any introductory phrases or commentary."""
+)
+
+_SECTION_CONFIG = types.GenerateContentConfig(
+    temperature=0.2,
+    response_mime_type="text/plain",
+    system_instruction=[_SECTION_SYS_PART],
+)
 
 
 def extract_video_id(youtube_url: str) -> Optional[str]:
@@ -23,85 +106,33 @@ def extract_video_id(youtube_url: str) -> Optional[str]:
     Returns:
         Optional[str]: The video ID or None if not found
     """
-    # Regular expressions for different YouTube URL formats
-    patterns = [
-        r"(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/|youtube\.com\/watch\?.*v=)([^&\n?#]+)",
-        r"(?:youtube\.com\/shorts\/)([^&\n?#]+)",
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, youtube_url)
-        if match:
-            return match.group(1)
+    match = VIDEO_ID_RE.search(youtube_url)
+    return match.group(1) if match else None
 
-    return None
 
-
-def get_video_metadata(video_id):
+async def get_video_metadata(
+    http_client: httpx.AsyncClient, video_id
+) -> Tuple[Dict[str, Any], bool]:
     """
     Retrieves metadata for a YouTube video given its ID.
 
     Args:
+        http_client: Shared async HTTP client used to call the YouTube Data API.
         video_id: The YouTube video ID (e.g., 'dQw4w9WgXcQ').
-        api_key: Your Google API key for YouTube Data API v3.
-                 You can obtain one from the Google Cloud Console:
-                 https://console.cloud.google.com/
 
     Returns:
-        A dictionary containing the video metadata, or None if an error occurred.
-        Example:
+        A tuple of the video metadata dictionary and a flag that is False when
+        placeholder metadata was returned instead. If the API request fails
+        (e.g., invalid API key, quota exceeded, video not found), errors are
+        logged and the placeholder is returned instead of raising.
+        Example metadata:
         {
-            'kind': 'youtube#videoListResponse',
-            'etag': '...',
-            'items': [{
-                'kind': 'youtube#video',
-                'etag': '...',
-                'id': 'dQw4w9WgXcQ',
-                'snippet': {
-                    'publishedAt': '2009-10-25T06:57:20Z',
-                    'channelId': 'UCn1jCMv6t4244jBpOhEm5XQ',
-                    'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
-                    'description': '...',
-                    'thumbnails': {
-                        'default': {'url': '...', 'width': 120, 'height': 90},
-                        'medium': {'url': '...', 'width': 320, 'height': 180},
-                        'high': {'url': '...', 'width': 480, 'height': 360},
-                        'standard': {'url': '...', 'width': 640, 'height': 480},
-                        'maxres': {'url': '...', 'width': 1280, 'height': 720}
-                    },
-                    'channelTitle': 'RickAstley',
-                    'tags': ['rick astley', 'never gonna give you up', 'rickrolling'],
-                    'categoryId': '10',
-                    'liveBroadcastContent': 'none',
-                    'localized': {
-                        'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
-                        'description': '...'
-                    },
-                    'defaultAudioLanguage': 'en'
-                },
-                'contentDetails': {
-                    'duration': 'PT3M33S',
-                    'dimension': '2d',
-                    'definition': 'hd',
-                    'caption': 'false',
-                    'licensedContent': True,
-                    'contentRating': {},
-                    'projection': 'rectangular'
-                },
-                'statistics': {
-                    'viewCount': '1417145751',
-                    'likeCount': '15371464',
-                    'favoriteCount': '0',
-                    'commentCount': '494259'
-                }
-            }],
-            'pageInfo': {'totalResults': 1, 'resultsPerPage': 1}
+            'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
+            'thumbnail_url': 'https://i.ytimg.com/vi/dQw4w9WgXcQ/maxresdefault.jpg',
+            'tags': ['rick astley', 'never gonna give you up', 'rickrolling'],
+            'publish_date': '2009-10-25T06:57:20Z',
+            'video_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
         }
-
-
-    Raises:
-        googleapiclient.errors.HttpError: If there's an issue with the API request (e.g., invalid API key, quota exceeded, video not found).
-        Exception: If there's another unexpected error.
     """
 
     # set the default response
@@ -115,34 +146,52 @@ def get_video_metadata(video_id):
 
     try:
 
-        youtube = build("youtube", "v3", developerKey=os.environ.get("YOUTUBE_API_KEY"))
-
-        request = youtube.videos().list(
-            part="snippet,contentDetails,statistics", id=video_id
+        http_response = await http_client.get(
+            YOUTUBE_VIDEOS_URL,
+            params={"part": "snippet,contentDetails,statistics", "id": video_id},
+            # Sent as a header so the key never appears in the request URL,
+            # which httpx includes in its error messages
+            headers={"X-Goog-Api-Key": os.environ.get("YOUTUBE_API_KEY", "")},
         )
+        http_response.raise_for_status()
 
-        response = request.execute()
+        response = http_response.json()
 
         # extract video metadata
         if "items" in response and len(response["items"]) > 0:
-            video_data = response["items"][0]
+            snippet = response["items"][0]["snippet"]
+            # not every video has tags or a maxres thumbnail
+            thumbnails = snippet.get("thumbnails", {})
+            thumbnail = thumbnails.get("maxres") or thumbnails.get("high")
             # add metadata
             metadata = {
-                "title": video_data["snippet"]["title"],
-                "thumbnail_url": video_data["snippet"]["thumbnails"]["maxres"]["url"],
-                "tags": video_data["snippet"]["tags"],
-                "publish_date": video_data["snippet"]["publishedAt"],
+                "title": snippet["title"],
+                "thumbnail_url": (
+                    thumbnail["url"] if thumbnail else metadata["thumbnail_url"]
+                ),
+                "tags": snippet.get("tags", []),
+                "publish_date": snippet["publishedAt"],
                 "video_url": f"https://www.youtube.com/watch?v={video_id}",
             }
+            return metadata, True
 
-        return metadata
+        return metadata, False
 
-    except HttpError as e:
-        print(f"An HTTP error occurred: {e}")
-        return metadata
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return metadata
+    except httpx.HTTPStatusError as e:
+        logger.warning(
+            "YouTube API returned HTTP %s fetching metadata for %s",
+            e.response.status_code,
+            video_id,
+        )
+        return metadata, False
+    except httpx.HTTPError as e:
+        logger.warning("%s fetching metadata for %s", type(e).__name__, video_id)
+        return metadata, False
+    except Exception:
+        logger.exception(
+            "An unexpected error occurred fetching metadata for %s", video_id
+        )
+        return metadata, False
 
 
 def get_video_transcript(video_id: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
@@ -158,14 +207,10 @@ def get_video_transcript(video_id: str) -> Tuple[List[Dict[str, Any]], Optional[
             - Error message if any
     """
     try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        transcript_list = YouTubeTranscriptApi().list(video_id)
 
-        # Try to get English transcript first
-        try:
-            transcript = transcript_list.find_transcript(["en"])
-        except:
-            # If English not available, get the first available transcript
-            transcript = transcript_list.find_transcript(["en-US", "en-GB"])
+        # Prefer the generic English transcript, then regional variants
+        transcript = transcript_list.find_transcript(["en", "en-US", "en-GB"])
 
         transcript_data = transcript.fetch()
         return transcript_data, None
@@ -188,111 +233,225 @@ def concatenate_transcript(transcript_data: List[Dict[str, Any]]) -> str:
     Returns:
         str: Concatenated transcript text
     """
-    return " ".join([segment.text for segment in transcript_data])
+    return " ".join(segment.text for segment in transcript_data)
 
 
-def generate_summary(transcript_text: str, video_metadata: Dict[str, Any]) -> str:
+def split_transcript(
+    transcript_text: str, chunk_chars: int = SUMMARY_CHUNK_CHARS
+) -> List[str]:
     """
-    Generate a summary of the video transcript using Gemini API.
+    Split a transcript into chunks of at most `chunk_chars` characters.
+
+    Chunks end at a sentence boundary where possible, falling back to a word
+    boundary and finally a hard cut.
 
     Args:
         transcript_text (str): The video transcript text
-        video_metadata (Dict[str, Any]): Video metadata
+        chunk_chars (int): Maximum characters per chunk
 
     Returns:
-        str: Generated summary
+        List[str]: Transcript chunks in order
+
+    Raises:
+        ValueError: If `chunk_chars` is less than 1
     """
-    # Initialize Gemini client
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+    if chunk_chars < 1:
+        raise ValueError("chunk_chars must be at least 1")
+
+    chunks = []
+    start = 0
+    while len(transcript_text) - start > chunk_chars:
+        end = start + chunk_chars
+        cut = transcript_text.rfind(". ", start, end)
+        if cut <= start:
+            cut = transcript_text.rfind(" ", start, end)
+        cut = end if cut <= start else cut + 1
+        chunks.append(transcript_text[start:cut].strip())
+        start = cut
+    chunks.append(transcript_text[start:].strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def build_summary_contents(
+    transcript_text: str, heading: str = "YouTube Video Transcript"
+) -> List[types.Content]:
+    """
+    Build the user prompt for summarizing a video transcript.
 
-    model = "gemini-2.0-flash-thinking-exp-01-21"
+    Args:
+        transcript_text (str): The video transcript text
+        heading (str): Label placed above the text in the prompt
 
+    Returns:
+        List[types.Content]: Contents to send to the Gemini API
+    """
     # Prepare prompt with video metadata
     prompt = f"""    
-    YouTube Video Transcript:
+    {heading}:
     {transcript_text}
     """
 
-    contents = [
+    return [
         types.Content(
             role="user",
             parts=[types.Part.from_text(text=prompt)],
         ),
     ]
-    
-    # add system prompts and generate configs
-    generate_content_config = types.GenerateContentConfig(
-        temperature=0.2,
-        response_mime_type="text/plain",
-        system_instruction=[
-            types.Part.from_text(text=f"""You are an expert YouTube transcript summarizer. Analyze the provided YouTube video transcript to identify its core concepts, major arguments, and essential information. Generate a concise yet comprehensive summary report structured according to the guidelines below. The goal is to allow someone to quickly understand the video's main message, key findings, and overall significance without watching the entire video.
 
-Output Structure & Guidelines:
 
-1.  Key Points / Core Concepts:
-    * Identify and list the 3-5 most critical concepts, arguments, or findings discussed in the video.
-    * Use concise, informative bullet points. Each point should represent a distinct major idea.
-    * Focus on *what* is being discussed, not just topic mentions.
+async def summarize_section(client: genai.Client, section_text: str) -> str:
+    """
+    Summarize one section of a long transcript into bullet-point notes.
 
+    Args:
+        client (genai.Client): Gemini client
+        section_text (str): One chunk of the transcript
 
-2.  Detailed Summary:
-    * Weave the Key Points identified above into a coherent narrative summary.
-    * Expand on each key point by incorporating supporting details, context, explanations, important facts, figures, statistics, or specific examples mentioned in the transcript.
-    * Ensure the summary flows logically, connecting the different ideas presented in the video.
-    * Maintain a neutral and objective tone, accurately reflecting the information in the transcript.
-    * Prioritize clarity and conciseness while ensuring all crucial information is included.
+    Returns:
+        str: Notes for the section
+    """
+    async with gemini_semaphore:
+        response = await client.aio.models.generate_content(
+            model=SUMMARY_MODEL,
+            contents=build_summary_contents(section_text, "Transcript Section"),
+            config=_SECTION_CONFIG,
+        )
+    return response.text
 
 
-3.  Main Takeaway / Conclusion:
-    * State the single most important message, conclusion, or call to action the video aims to convey.
-    * This should encapsulate the essence or primary purpose of the video in one or two sentences.
+async def build_final_summary_contents(
+    client: genai.Client, transcript_text: str
+) -> List[types.Content]:
+    """
+    Build the final summary prompt, condensing long transcripts first.
+
+    Short transcripts are sent as is. Long ones are split into chunks that are
+    summarized in parallel, and the final call summarizes the section notes.
+
+    Args:
+        client (genai.Client): Gemini client
+        transcript_text (str): The video transcript text
+
+    Returns:
+        List[types.Content]: Contents for the final summary call
+    """
+    chunks = split_transcript(transcript_text)
+    if len(chunks) <= 1:
+        return build_summary_contents(transcript_text)
+
+    notes = await asyncio.gather(
+        *(summarize_section(client, chunk) for chunk in chunks)
+    )
+    combined = "\n\n".join(
+        f"Section {index}:\n{note}" for index, note in enumerate(notes, start=1)
+    )
+    return build_summary_contents(
+        combined, "Notes from consecutive sections of the YouTube Video Transcript"
+    )
 
-Mandatory Formatting & Rules:
-* Format the entire output using Markdown for readability (use bullet points, bolding where appropriate).
-* Strictly adhere to the section structure: Key Points, Detailed Summary, Main Takeaway.
-* **Do not** include any introductory phrases like \"Here's a summary...\" or \"This report summarizes...\".
-* Base the summary *only* on the provided transcript text. Do not add external information or interpretations not explicitly supported by the transcript."""),
-        ],
-    )  
-    
 
+async def generate_summary(
+    client: genai.Client, transcript_text: str, video_metadata: Dict[str, Any]
+) -> str:
+    """
+    Generate a summary of the video transcript using Gemini API.
+
+    Args:
+        client (genai.Client): Shared Gemini client
+        transcript_text (str): The video transcript text
+        video_metadata (Dict[str, Any]): Video metadata
+
+    Returns:
+        str: Generated summary
+    """
     try:
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config
-        )
+        contents = await build_final_summary_contents(client, transcript_text)
+        async with gemini_semaphore:
+            response = await client.aio.models.generate_content(
+                model=SUMMARY_MODEL,
+                contents=contents,
+                config=_SUMMARY_CONFIG,
+            )
         return response.text
-    except Exception as e:
-        print(f"Error generating summary: {str(e)}")
-        return "Failed to generate summary. Please try again later."
+    except Exception:
+        logger.exception("Error generating summary")
+        return SUMMARY_FAILED_MESSAGE
 
 
-def process_youtube_video(youtube_url: str) -> Dict[str, Any]:
+async def generate_summary_stream(
+    client: genai.Client, transcript_text: str, video_metadata: Dict[str, Any]
+) -> AsyncIterator[str]:
     """
-    Process a YouTube video to extract transcript and generate summary.
+    Stream a summary of the video transcript from the Gemini API as it is generated.
 
     Args:
-        youtube_url (str): The YouTube URL
+        client (genai.Client): Shared Gemini client
+        transcript_text (str): The video transcript text
+        video_metadata (Dict[str, Any]): Video metadata
 
-    Returns:
-        Dict[str, Any]: Processing results including summary and metadata
+    Yields:
+        str: Chunks of the generated summary
+
+    Raises:
+        Exception: If generation fails, possibly after some chunks were yielded.
     """
-    # Extract video ID
-    video_id = extract_video_id(youtube_url)
-    if not video_id:
-        return {
-            "success": False,
-            "error": "Invalid YouTube URL. Could not extract video ID.",
-        }
+    try:
+        contents = await build_final_summary_contents(client, transcript_text)
+
+        # Drain the Gemini stream from a separate task so the shared semaphore
+        # slot is released as soon as generation ends, however slowly the
+        # caller consumes the chunks
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce() -> None:
+            try:
+                async with gemini_semaphore:
+                    stream = await client.aio.models.generate_content_stream(
+                        model=SUMMARY_MODEL,
+                        contents=contents,
+                        config=_SUMMARY_CONFIG,
+                    )
+                    async for chunk in stream:
+                        if chunk.text:
+                            queue.put_nowait(chunk.text)
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (text := await queue.get()) is not None:
+                yield text
+            # Surface any generation error from the producer
+            await producer
+        finally:
+            # Stop generating if the consumer goes away early
+            producer.cancel()
+    except Exception:
+        logger.exception("Error generating summary")
+        raise
+
+
+async def fetch_video_transcript(
+    http_client: httpx.AsyncClient, transcript_executor: Executor, video_id: str
+) -> Dict[str, Any]:
+    """
+    Fetch the metadata and transcript text of a YouTube video concurrently.
 
-    # Get video metadata
-    metadata = get_video_metadata(video_id)
+    Args:
+        http_client (httpx.AsyncClient): Shared async HTTP client
+        transcript_executor (Executor): Pool for the blocking transcript fetch
+        video_id (str): The YouTube video ID
 
-    # Get video transcript
-    transcript_data, error = get_video_transcript(video_id)
+    Returns:
+        Dict[str, Any]: Metadata and transcript text, or an error message.
+            `metadata_found` is False when the metadata is a placeholder.
+    """
+    # Fetch video metadata and transcript concurrently, off the event loop
+    loop = asyncio.get_running_loop()
+    (metadata, metadata_found), (transcript_data, error) = await asyncio.gather(
+        get_video_metadata(http_client, video_id),
+        loop.run_in_executor(transcript_executor, get_video_transcript, video_id),
+    )
 
     if error:
         return {"success": False, "error": error, "metadata": metadata}
@@ -307,7 +466,47 @@ def process_youtube_video(youtube_url: str) -> Dict[str, Any]:
     # Concatenate transcript segments
     transcript_text = concatenate_transcript(transcript_data)
 
+    return {
+        "success": True,
+        "metadata": metadata,
+        "metadata_found": metadata_found,
+        "transcript_text": transcript_text,
+    }
+
+
+async def process_youtube_video(
+    client: genai.Client,
+    http_client: httpx.AsyncClient,
+    transcript_executor: Executor,
+    video_id: str,
+) -> Dict[str, Any]:
+    """
+    Process a YouTube video to extract transcript and generate summary.
+
+    Args:
+        client (genai.Client): Shared Gemini client
+        http_client (httpx.AsyncClient): Shared async HTTP client
+        transcript_executor (Executor): Pool for the blocking transcript fetch
+        video_id (str): The YouTube video ID
+
+    Returns:
+        Dict[str, Any]: Processing results including summary and metadata
+    """
+    cached = _RESULT_CACHE.get(video_id)
+    if cached is not None:
+        return cached
+
+    video = await fetch_video_transcript(http_client, transcript_executor, video_id)
+    if not video["success"]:
+        return video
+
+    metadata = video["metadata"]
+
     # Generate summary
-    summary = generate_summary(transcript_text, metadata)
+    summary = await generate_summary(client, video["transcript_text"], metadata)
 
-    return {"success": True, "metadata": metadata, "summary": summary}
+    result = {"success": True, "metadata": metadata, "summary": summary}
+    # Don't pin a failed generation or placeholder metadata in the cache
+    if summary != SUMMARY_FAILED_MESSAGE and video["metadata_found"]:
+        _RESULT_CACHE[video_id] = result
+    return result